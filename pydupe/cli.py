@@ -1,17 +1,11 @@
-from re import I
 import typing
 from os import environ
 from pathlib import Path as p
 
 import rich_click as click
-from rich import print
-from rich.console import Console
-from rich.panel import Panel
 
-import pydupe.dupetable as dupetable
-from pydupe.cmd import cmd_clean, cmd_hash, cmd_purge
-from pydupe.console import console
-from pydupe.db import PydupeDB
+# pydupe modules and rich extras are imported within the commands that need them,
+# so startup (e.g. --help) does not pay for them.
 
 environ["PAGER"] = "less -r"
 
@@ -32,6 +26,8 @@ def lst(ctx: click.Context, depth: int) -> None:
     """
     list directories with the most dupes until DEPTH.
     """
+    import pydupe.dupetable as dupetable
+
     dbname = ctx.obj['dbname']
     Dp = dupetable.Dupes(dbname)
     Dp.print_most_common(depth)
@@ -64,6 +60,9 @@ def dd(ctx: click.Context, match_deletions: bool, autoselect: bool, dupes_global
     if do_move is False, a dry run is done and a pretty printed table is shown and saved as html for further inspection.
     
     """
+    import pydupe.dupetable as dupetable
+    from pydupe.console import console
+
     option: typing.Dict[str, typing.Any] = {}
     option['dbname'] = ctx.obj['dbname']
     option['deldir'] = deldir.resolve()
@@ -99,6 +98,8 @@ def hash(ctx: click.Context, path: p) -> None:
     """
     recursive hash files in PATH and store hash in database.
     """
+    from pydupe.cmd import cmd_hash
+
     cmd_hash(dbname=ctx.obj['dbname'], path=path.resolve())
 
 
@@ -108,6 +109,8 @@ def purge(ctx: click.Context) -> None:
     """
     purge database: delete lookup and all files in permanent that are not available anymore
     """
+    from pydupe.cmd import cmd_purge
+
     dbname = ctx.obj['dbname']
     cmd_purge(dbname)
 
@@ -117,6 +120,8 @@ def clean(ctx: click.Context) -> None:
     """
     clean database: delete lookup
     """
+    from pydupe.cmd import cmd_clean
+
     dbname = ctx.obj['dbname']
     cmd_clean(dbname)
 
@@ -125,6 +130,8 @@ def help() -> None:
     """
     Display some useful expressions for exiftool.
     """
+    from rich import print
+    from rich.panel import Panel
     
     exiftool_help= """
     [blue]show dateTimeOriginal for all files:\t[magenta]exiftool -p '$filename $dateTimeOriginal' .
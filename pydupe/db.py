@@ -1,9 +1,20 @@
+import os
 from pathlib import Path as p
 import sqlite3
 import typing as tp
 import types as ty
 from pydupe.data import fparms
 
+def dir_range(dirname: str, sep: str = os.sep) -> tuple[str, str]:
+    """
+    returns (lower, upper) such that exactly the filenames within dirname satisfy lower <= filename < upper.
+    The character following sep in code point order is the exclusive upper bound.
+    """
+    lower = dirname if dirname.endswith(sep) else dirname + sep
+    upper = lower[:-1] + chr(ord(sep) + 1)
+    return lower, upper
+
+
 class PydupeDB(object):
     """
     sqlite3 database class for pydupe. 
@@ -21,6 +32,13 @@ class PydupeDB(object):
         self.connection = sqlite3.connect(self._dbname)
         self.connection.row_factory = sqlite3.Row
         self.cur = self.connection.cursor()
+        # WAL with synchronous=NORMAL syncs only at checkpoints, not on every commit. The database
+        # stays consistent after a crash or power loss, but the last commits may be lost. This is
+        # acceptable, the database is a cache that is rebuilt by hashing the files again.
+        self.execute("PRAGMA journal_mode=WAL")
+        self.execute("PRAGMA synchronous=NORMAL")
+        self.execute("PRAGMA temp_store=MEMORY")
+        self.execute("PRAGMA cache_size=-65536")  # 64 MiB
         create_table_if_not_exist_sql = """
                             CREATE TABLE IF NOT EXISTS lookup (
                             filename TEXT PRIMARY KEY,
@@ -39,6 +57,8 @@ class PydupeDB(object):
                             mtime INTEGER,
                             ctime INTEGER)"""
         self.execute(create_table_if_not_exist_sql)
+        # dupes are found by joining lookup on hash, without an index every hash rescans the table
+        self.execute("CREATE INDEX IF NOT EXISTS idx_lookup_hash ON lookup(hash)")
         self.commit()
 
     def __enter__(self) -> 'PydupeDB' :
@@ -68,6 +88,20 @@ class PydupeDB(object):
         get_sql = "SELECT l.filename, l.hash FROM lookup l JOIN (SELECT hash, count(*) c FROM lookup GROUP BY hash HAVING c > 1) h on l.hash = h.hash order by l.hash"
         return self.cur.execute(get_sql)
 
+    def get_dupes_partitioned(self, deldir: p) -> tuple[list[sqlite3.Row], list[sqlite3.Row]]:
+        """
+        returns dupes within deldir and dupes outside deldir that share a hash with a dupe within deldir.
+        filename is the primary key of lookup, so the range test on filename is an indexed scan.
+        """
+        prefix, upper = dir_range(str(deldir))
+        dupes_sql = "SELECT l.filename, l.hash FROM lookup l JOIN (SELECT hash, count(*) c FROM lookup GROUP BY hash HAVING c > 1) h on l.hash = h.hash"
+        in_deldir_sql = dupes_sql + " WHERE l.filename >= ? AND l.filename < ? order by l.hash"
+        outside_deldir_sql = dupes_sql + """ WHERE NOT (l.filename >= ? AND l.filename < ?)
+                        AND l.hash IN (SELECT hash FROM lookup WHERE filename >= ? AND filename < ?) order by l.hash"""
+        in_deldir = self.cur.execute(in_deldir_sql, (prefix, upper)).fetchall()
+        outside_deldir = self.cur.execute(outside_deldir_sql, (prefix, upper, prefix, upper)).fetchall()
+        return in_deldir, outside_deldir
+
     def delete_dir(self, dirname: p) -> sqlite3.Cursor:
         dirname_str: str = str(dirname)
         delete_sql = "DELETE FROM lookup WHERE filename LIKE ?"
@@ -77,6 +111,11 @@ class PydupeDB(object):
         delete_sql = "DELETE from lookup where filename is ?"
         return self.cur.execute(delete_sql, (str(filename),))
 
+    def delete_files_lookup(self, filenames: tp.Sequence[tp.Union[str, p]]) -> sqlite3.Cursor:
+        # one statement per call, len(filenames) must not exceed SQLITE_MAX_VARIABLE_NUMBER
+        delete_sql = f"DELETE from lookup where filename IN ({','.join('?' * len(filenames))})"
+        return self.cur.execute(delete_sql, [str(f) for f in filenames])
+
     def delete_file_permanent(self, filename: p) -> sqlite3.Cursor:
         delete_sql = "DELETE from permanent where filename is ?"
         return self.cur.execute(delete_sql, (str(filename),))
@@ -1,10 +1,13 @@
-import copy
+import concurrent.futures
 import itertools
 import logging
+import os
 import re
 import shutil
+import stat
 import sys
 import typing as tp
+from collections import Counter, deque
 from pathlib import Path as p
 
 from more_itertools import chunked
@@ -24,6 +27,16 @@ logging.basicConfig(level=cnf['LOGLEVEL'], format=FORMAT, datefmt="[%X]", handle
                     RichHandler(show_level=True, show_path=True, markup=True, console=console)])
 log = logging.getLogger(__name__)
 
+# files per chunk, one lookup delete statement and one commit per chunk.
+# 999 is the limit of sql variables per statement for SQLite < 3.32
+DELETE_CHUNKSIZE = 999
+MOVE_WORKERS = 8
+# files per task in validate, one future per file costs more than the lstat itself
+VALIDATE_CHUNKSIZE = 1000
+
+# drains an iterator that is run only for its side effects, without storing the items
+_CONSUME: tp.Callable[[tp.Iterable[tp.Any]], None] = deque(maxlen=0).extend
+
 
 class Error(Exception):
     """Base class for exceptions in this module."""
@@ -49,26 +62,27 @@ class DupeNotValidated(Error):
     """Argument missing."""
 
 
-def rename_if_exists(file: p) -> p:
-    # rename if file exists
-
-    if file.exists():
+def rename_if_exists(file: str) -> str:
+    """
+    rename if file exists: returns file or, if it exists, file with _1, _2, ... appended to the stem.
+    Probes with os.path.exists, so name clashes are found on case insensitive filesystems as well.
+    """
+    newPath = file
+    if os.path.exists(file):
         numb = 1
-        file_stem = file.stem
+        file_stem, file_suffix = os.path.splitext(file)
         while True:
-            newPath = file.with_stem(file_stem + "_" + str(numb))
-            if newPath.exists():
+            newPath = file_stem + "_" + str(numb) + file_suffix
+            if os.path.exists(newPath):
                 numb += 1
             else:
-                return newPath
-    return file
+                break
+    return newPath
 
 def move_file_to_trash(*, file: p, trash: p, delete: bool) -> str:
     assert isinstance(file, p)
-
-    target = p(str(trash) + str(file))
-
-    target = rename_if_exists(target)
+    # work on strings, Path objects are not needed for moving or deleting
+    file_str = str(file)
 
     # this was an issue with freebsd during moving across filesystems
     # try:
@@ -84,13 +98,45 @@ def move_file_to_trash(*, file: p, trash: p, delete: bool) -> str:
     #     else:
     #         raise
     if delete:
-        file.unlink()
+        os.unlink(file_str)
     else:
-        if not target.parent.is_dir():
-            target.parent.mkdir(parents=True)
-        shutil.move(src = file, dst = target)
+        target = rename_if_exists(str(trash) + file_str)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.move(src = file_str, dst = target)
+
+    return file_str
+
+
+def check_file(file: str) -> None:
+    """ raises if file does not exist, is a symlink or is a directory. Needs a single lstat. """
+    try:
+        st = os.lstat(file)
+    except (FileNotFoundError, NotADirectoryError):
+        # NotADirectoryError: a parent of file is no longer a directory
+        raise DupeFileNotFound(file)
+    if stat.S_ISLNK(st.st_mode):
+        raise DupeIsSymLink(file)
+    if stat.S_ISDIR(st.st_mode):
+        raise DupeIsDirectory(file)
 
-    return str(file)
+
+def check_files(files: tp.Iterable[str]) -> None:
+    """ check_file for each file, raises on the first file failing. """
+    for file in files:
+        check_file(file)
+
+
+def move_files_to_trash(*, files: tp.Iterable[p], trash: p, delete: bool, moved: tp.Optional[list[str]] = None) -> list[str]:
+    """
+    moves files one after the other. Used for files of the same directory, as renaming on name clashes is not thread safe.
+    Each moved file is also appended to moved, so the caller knows what was moved if a later file fails.
+    """
+    done: list[str] = []
+    for file in files:
+        done.append(move_file_to_trash(file=file, trash=trash, delete=delete))
+        if moved is not None:
+            moved.append(done[-1])
+    return done
 
 
 def is_relative_to(parent: p, testfile: p) -> bool:
@@ -116,62 +162,151 @@ def check_and_autoselect(*, deltable: LuTable[str, p], keeptable: LuTable[str, p
     """
 
     autoselect_pattern_compiled = re.compile(autoselect_pattern)
-    old_deltable: LuTable[str, p] = copy.deepcopy(deltable)
-
-    for hsh in sorted(old_deltable.keys()):
-        if hsh not in keeptable.keys():
+    # shortcuts for the patterns used by dd3
+    match_nothing = autoselect_pattern == "a^"
+    match_anything = autoselect_pattern == "."
+
+    # snapshot the keys, deltable is changed within the loop. Hashes are independent, so order does not matter.
+    keeptable_keys = keeptable.keys()
+    for hsh in list(deltable.keys()):
+        if hsh not in keeptable_keys:
+            # select before files are moved: the first matching file in sort order, without sorting
+            selected: tp.Optional[p] = None
+            if match_anything:
+                selected = min(deltable[hsh])
+            elif not match_nothing:
+                selected = min((f for f in deltable[hsh] if autoselect_pattern_compiled.search(f.name)), default=None)
             # all files will be deleted -> move everything to keeptable
             keeptable.lextend(deltable, hsh)
             deltable.ldel([hsh])
             # now check, if one of these files should be deleted nevertheless
-            values = sorted(old_deltable[hsh])
-            for f in values:
-                fname = f.name
-                if autoselect_pattern_compiled.search(fname):
-                    keeptable.discard((hsh, f))
-                    assert len(keeptable[hsh]) > 0
-                    deltable.add((hsh, f))
-                    break
+            if selected is not None:
+                keeptable.discard((hsh, selected))
+                assert len(keeptable[hsh]) > 0
+                deltable.add((hsh, selected))
 
     return deltable, keeptable
 
 
-def get_dupes(dbname: p = p.home() / ".pydupe.sqlite") -> LuTable[str, p]:
-    hashlu: LuTable[str, p] = LuTable()
+# hashes are interned when read from the database: all LuTables built from them share the key objects,
+# so dict lookups of a hash in another table compare by identity.
+
+def iter_dupes(dbname: p = p.home() / ".pydupe.sqlite") -> tp.Iterator[tuple[str, p]]:
     with PydupeDB(dbname) as db:
         for row in db.get_dupes():
-            file_as_path = p(row['filename'])
-            hsh: str = row['hash']
-            hashlu.add((hsh, file_as_path))
-    return hashlu
+            yield sys.intern(row['hash']), p(row['filename'])
 
 
-def dd3(dupes: LuTable[str, p], *, deldir: p, pattern: str, match_deletions: bool = True, dupes_global: bool = False, autoselect: bool = False) -> tp.Tuple[LuTable[str, p], LuTable[str, p]]:
+def get_dupes(dbname: p = p.home() / ".pydupe.sqlite") -> LuTable[str, p]:
+    return LuTable(iter_dupes(dbname))
+
+
+def get_dupes_partitioned(deldir: p, dbname: p = p.home() / ".pydupe.sqlite") -> tuple[LuTable[str, p], LuTable[str, p]]:
     """
-    identify dupes within <deldir> to delete based on <pattern> matching.
-    match_deletions: if True (default), matches will be marked for deletion otherwise non-matches will be marked.
-    dupes_global: if False(default), at least one dupe will be preserved within deldir,
-                        if True, all dupes within deldir will be deleted if at least on dupe exists outside deldir.
-    autoselect: if dupes_global is True and no dupe exists outside deldir, autoselect dupes within deldir.
+    returns (in_deldir_hashlu, outside_deldir_hashlu). Partitioning is done by the database,
+    outside_deldir_hashlu contains only dupes that have a dupe within deldir.
     """
-    # deldir ist the Directory to investigate
+    with PydupeDB(dbname) as db:
+        in_deldir, outside_deldir = db.get_dupes_partitioned(deldir)
+    in_deldir_hashlu: LuTable[str, p] = LuTable((sys.intern(row['hash']), p(row['filename'])) for row in in_deldir)
+    del in_deldir  # release the rows before grouping the second table
+    outside_deldir_hashlu: LuTable[str, p] = LuTable((sys.intern(row['hash']), p(row['filename'])) for row in outside_deldir)
+    return in_deldir_hashlu, outside_deldir_hashlu
 
-    # in_deldir_hashlu and outside_deldir_hashlu separate dupes in deldir from dupes outside deldir
+
+def partition(dupes: tp.Iterable[tuple[str, p]], *, deldir: p) -> tuple[LuTable[str, p], LuTable[str, p]]:
+    """
+    separates dupes in deldir from dupes outside deldir. Same result as get_dupes_partitioned,
+    but for dupes already in memory.
+    """
     in_deldir_hashlu: LuTable[str, p] = LuTable()
     outside_deldir_hashlu: LuTable[str, p] = LuTable()
-    t: mytimer = mytimer()
+
+    # files are absolute and normalized, so a prefix test is equivalent to is_relative_to.
+    # normcase folds case and separators where the filesystem does (Windows), like is_relative_to.
+    normcase = os.path.normcase
+    deldir_str = normcase(os.path.join(str(deldir), ''))
 
     for hsh, f in dupes:
-        if p(f).is_relative_to(deldir):
-            #if is_relative_to(parent=p(deldir), testfile=f):
+        if normcase(str(f)).startswith(deldir_str):
             in_deldir_hashlu.add((hsh, f))
         else:
             outside_deldir_hashlu.add((hsh, f))
-    log.debug("done: partition according to "+str(deldir)+" "+t.get)
 
     # delete from outside_deldir_hashlu dupes that are not also in in_deldir_hashlu
-    delitems = set(outside_deldir_hashlu.keys())-set(in_deldir_hashlu.keys())
-    outside_deldir_hashlu.ldel(delitems)
+    in_deldir_keys = in_deldir_hashlu.keys()
+    outside_deldir_hashlu.ldel(
+        [key for key in outside_deldir_hashlu.keys() if key not in in_deldir_keys])
+
+    return in_deldir_hashlu, outside_deldir_hashlu
+
+
+def dd3(dupes: tp.Iterable[tuple[str, p]], *, deldir: p, pattern: str, match_deletions: bool = True, dupes_global: bool = False, autoselect: bool = False) -> tp.Tuple[LuTable[str, p], LuTable[str, p]]:
+    """
+    identify dupes within <deldir> to delete based on <pattern> matching.
+    dupes: a LuTable or a stream of (hash, file) as returned by iter_dupes.
+    match_deletions: if True (default), matches will be marked for deletion otherwise non-matches will be marked.
+    dupes_global: if False(default), at least one dupe will be preserved within deldir,
+                        if True, all dupes within deldir will be deleted if at least on dupe exists outside deldir.
+    autoselect: if dupes_global is True and no dupe exists outside deldir, autoselect dupes within deldir.
+    """
+    # deldir ist the Directory to investigate
+    t: mytimer = mytimer()
+
+    # in_deldir_hashlu and outside_deldir_hashlu separate dupes in deldir from dupes outside deldir
+    in_deldir_hashlu, outside_deldir_hashlu = partition(dupes, deldir=deldir)
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("done: partition according to %s %s", deldir, t.get)
+
+    return dd3_partitioned(in_deldir_hashlu, outside_deldir_hashlu, pattern=pattern,
+                           match_deletions=match_deletions, dupes_global=dupes_global, autoselect=autoselect)
+
+
+# now sort the matches in deltable or keeptable and treat also global dupes.
+# One function per combination of match_deletions and dupes_global, each returns (deltable, keeptable).
+
+def _select_deletions_global(match_pattern_hashlu: LuTable[str, p], no_match_pattern_hashlu: LuTable[str, p], outside_deldir_hashlu: LuTable[str, p]) -> tp.Tuple[LuTable[str, p], LuTable[str, p]]:
+    # delete matches, keep all not yet specified to be deleted and all dupes outside deldir
+    no_match_pattern_hashlu |= outside_deldir_hashlu
+    return match_pattern_hashlu, no_match_pattern_hashlu
+
+
+def _select_deletions_local(match_pattern_hashlu: LuTable[str, p], no_match_pattern_hashlu: LuTable[str, p], outside_deldir_hashlu: LuTable[str, p]) -> tp.Tuple[LuTable[str, p], LuTable[str, p]]:
+    # need to delete hashes with just one dupe in deltable and no dupe in keeptable.
+    # This is because if dupes_local, single dupes (from the global level) should be
+    # treated as no dupe if taken just the local scope into account.
+    # Application is limited, but a key error is raised later otherwise.
+    no_match_keys = no_match_pattern_hashlu.keys()
+    match_pattern_hashlu.ldel([key for key, bucket in zip(match_pattern_hashlu.keys(), match_pattern_hashlu.values())
+                               if key not in no_match_keys and len(bucket) == 1])
+    return match_pattern_hashlu, no_match_pattern_hashlu
+
+
+def _select_keeps_global(match_pattern_hashlu: LuTable[str, p], no_match_pattern_hashlu: LuTable[str, p], outside_deldir_hashlu: LuTable[str, p]) -> tp.Tuple[LuTable[str, p], LuTable[str, p]]:
+    # keep matches, delete all not yet specified to be kept and all dupes outside deldir
+    no_match_pattern_hashlu |= outside_deldir_hashlu
+    return no_match_pattern_hashlu, match_pattern_hashlu
+
+
+def _select_keeps_local(match_pattern_hashlu: LuTable[str, p], no_match_pattern_hashlu: LuTable[str, p], outside_deldir_hashlu: LuTable[str, p]) -> tp.Tuple[LuTable[str, p], LuTable[str, p]]:
+    # keep matches, delete all not yet specified to be kept
+    return no_match_pattern_hashlu, match_pattern_hashlu
+
+
+# key is (match_deletions, dupes_global)
+_SELECT = {
+    (True, True): _select_deletions_global,
+    (True, False): _select_deletions_local,
+    (False, True): _select_keeps_global,
+    (False, False): _select_keeps_local,
+}
+
+
+def dd3_partitioned(in_deldir_hashlu: LuTable[str, p], outside_deldir_hashlu: LuTable[str, p], *, pattern: str, match_deletions: bool = True, dupes_global: bool = False, autoselect: bool = False) -> tp.Tuple[LuTable[str, p], LuTable[str, p]]:
+    """
+    same as dd3, but for dupes already partitioned by partition or get_dupes_partitioned.
+    """
+    t: mytimer = mytimer()
 
     # match_pattern_hashlu and no_match_pattern_hashlu contain matches/no-matches to pattern for files within deldir
     match_pattern_hashlu: LuTable[str, p] = LuTable()
@@ -179,43 +314,18 @@ def dd3(dupes: LuTable[str, p], *, deldir: p, pattern: str, match_deletions: boo
 
     pattern_compiled = re.compile(pattern)
 
-    for hash, f in in_deldir_hashlu:
-        if pattern_compiled.search(f.name):
-            match_pattern_hashlu.add((hash, f))
+    search = pattern_compiled.search
+    for hsh, f in in_deldir_hashlu:
+        if search(f.name):
+            match_pattern_hashlu.add((hsh, f))
         else:
-            no_match_pattern_hashlu.add((hash, f))
-    log.debug("done: partition matches "+t.get)
+            no_match_pattern_hashlu.add((hsh, f))
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("done: partition matches %s", t.get)
 
     # keeptable and deltable are hash-lookups for files to keep and delete respectively
-    keeptable: LuTable[str, p] = LuTable()
-    deltable: LuTable[str, p] = LuTable()
-
-    # now sort the matches in deltable or keeptable and trat also global dupes
-    if match_deletions:
-        deltable = match_pattern_hashlu
-        # keep all not yet specified to be delted.
-        keeptable = no_match_pattern_hashlu
-
-        if dupes_global:
-            keeptable |= outside_deldir_hashlu
-        else:
-            # need to delete hashes with just one dupe in deltable and no dupe in keeptable.
-            # This is because if dupes_local, single dupes (from the global level) should be
-            # treated as no dupe if taken just the local scope into account.
-            # Application is limited, but a key error is raised later otherwise.
-            keys_only_in_deltable = set(
-                deltable.keys()) - set(keeptable.keys())
-            for key in keys_only_in_deltable:
-                if len(deltable[key]) == 1:
-                    del deltable[key]
-
-    else:
-        keeptable = match_pattern_hashlu
-        # delete all not yet specified to be kept
-        deltable = no_match_pattern_hashlu
-
-        if dupes_global:
-            deltable |= outside_deldir_hashlu
+    select = _SELECT[(match_deletions, dupes_global)]
+    deltable, keeptable = select(match_pattern_hashlu, no_match_pattern_hashlu, outside_deldir_hashlu)
 
     if autoselect:
         autoselect_pattern = "."  # matches anything
@@ -225,21 +335,30 @@ def dd3(dupes: LuTable[str, p], *, deldir: p, pattern: str, match_deletions: boo
     deltable, keeptable = check_and_autoselect(
         deltable=deltable, keeptable=keeptable, autoselect_pattern=autoselect_pattern)
 
-    log.debug("done: separated into deltable and keeptable "+t.get)
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("done: separated into deltable and keeptable %s", t.get)
     return deltable, keeptable
 
 
 class Dupes:
+    """dupes are loaded from the database on first access of attribute dupes."""
 
     def __init__(self, dbname: p = p.home() / ".pydupe.sqlite") -> None:
-        self.dupes: LuTable[str, p] = get_dupes(dbname)
+        self._dbname: p = dbname
+        self._dupes: tp.Optional[LuTable[str, p]] = None
+
+    @property
+    def dupes(self) -> LuTable[str, p]:
+        if self._dupes is None:
+            self._dupes = get_dupes(self._dbname)
+        return self._dupes
 
     def get_dir_counter(self) -> tp.Counter[str]:
-        alldupes = self.dupes.chain_values()
-        dir_counter: tp.Counter[str] = tp.Counter()
-        for x in alldupes:
-            dir_counter.update({str(x.parent): 1})
-        return dir_counter
+        # count on filename strings, no Path objects are needed to get the parent directory
+        if self._dupes is None:
+            with PydupeDB(self._dbname) as db:
+                return Counter(os.path.dirname(row['filename']) for row in db.get_dupes())
+        return Counter(map(os.path.dirname, self._dupes.chain_values_str()))
 
     def print_most_common(self, depth: int) -> None:
         table = Table()
@@ -247,8 +366,9 @@ class Dupes:
                          style="cyan", no_wrap=True)
         table.add_column("# of dupes", justify="left", style="green")
 
-        if len(self.dupes):
-            for f, c in self.get_dir_counter().most_common(depth):
+        dir_counter = self.get_dir_counter()
+        if dir_counter:
+            for f, c in dir_counter.most_common(depth):
                 table.add_row(f, str(c))
             console.print(table)
         else:
@@ -264,7 +384,6 @@ class Dupetable(Dupes):
     def __init__(self, *, deldir: p, pattern: str, match_deletions: bool = True, dupes_global: bool = False, autoselect: bool = False, dbname: p = p.home() / ".pydupe.sqlite", dedupe: bool = False) -> None:
         super().__init__(dbname=dbname)
         self._deduped: bool = False
-        self._dbname: p = dbname
         self._deldir: p = deldir
         self._pattern: str = pattern
         self._match_deletions: bool = match_deletions
@@ -279,8 +398,9 @@ class Dupetable(Dupes):
 
     def dedupe(self) -> None:
 
-        self._deltable, self._keeptable = dd3(
-            self.dupes, deldir=self._deldir, pattern=self._pattern, match_deletions=self._match_deletions, dupes_global=self._dupes_global, autoselect=self._autoselect)
+        in_deldir_hashlu, outside_deldir_hashlu = get_dupes_partitioned(self._deldir, self._dbname)
+        self._deltable, self._keeptable = dd3_partitioned(
+            in_deldir_hashlu, outside_deldir_hashlu, pattern=self._pattern, match_deletions=self._match_deletions, dupes_global=self._dupes_global, autoselect=self._autoselect)
         self._deduped = True
 
     def get_deltable(self) -> LuTable[str, p]:
@@ -295,13 +415,15 @@ class Dupetable(Dupes):
         dupestree = Tree(
             "[bold]Dupes Tree [not bold red] red: dupes to be deleted [green] green: dupes to keep")
 
-        for hash in self._deltable.keys() | self._keeptable.keys():
+        deltable_keys = self._deltable.keys()
+        keeptable_keys = self._keeptable.keys()
+        for hash in deltable_keys | keeptable_keys:
             branch = dupestree.add(hash[:10] + "...")
 
-            if hash in self._deltable.keys():
+            if hash in deltable_keys:
                 for delfile in self._deltable[hash]:
                     branch.add("[red]" + str(delfile))
-            if hash in self._keeptable.keys():
+            if hash in keeptable_keys:
                 for keepfile in self._keeptable[hash]:
                     branch.add("[green]" + str(keepfile))
 
@@ -321,13 +443,10 @@ class Dupetable(Dupes):
                     "File selected for deletion and to be kept at the same time: ", str(set_keep & set_delete))
 
         # test for existance, not a directory and not a symlink
-        for file in itertools.chain(self._keeptable.chain_values(), self._deltable.chain_values()):
-            if not file.exists():
-                raise DupeFileNotFound(str(file))
-            elif file.is_dir():
-                raise DupeIsDirectory(str(file))
-            elif file.is_symlink():
-                raise DupeIsSymLink(str(file))
+        # lstat releases the GIL, so chunks of files are checked in parallel; map raises the first exception in order
+        all_files = itertools.chain(self._keeptable.chain_values_str(), self._deltable.chain_values_str())
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            _CONSUME(executor.map(check_files, chunked(all_files, VALIDATE_CHUNKSIZE)))
 
     def delete(self, trash: p, delete: bool) -> None:
 
@@ -338,9 +457,6 @@ class Dupetable(Dupes):
         console.print("[green]validating dupes")
         self.validate()
 
-        filelist_chunked = list(
-            chunked(self._deltable.chain_values(), 20))
-
         if delete:
             displaytext_plan = "[red]deleting files ..."
             displaytext_done = "[green]deleted "
@@ -350,17 +466,33 @@ class Dupetable(Dupes):
 
         with Progress(console=console) as progress:
             task_move_file_to_trash = progress.add_task(
-                displaytext_plan, total=len(filelist_chunked))
-
-            for chunk in filelist_chunked:
-                with PydupeDB(self._dbname) as db:
+                displaytext_plan, total=len(self._deltable))
+
+            with PydupeDB(self._dbname) as db, concurrent.futures.ThreadPoolExecutor(max_workers=MOVE_WORKERS) as executor:
+                # one write transaction per chunk to limit the number of syncs
+                db.execute("BEGIN IMMEDIATE")
+                for chunk in chunked(self._deltable.chain_values(), DELETE_CHUNKSIZE):
+                    # moving is I/O bound, directories are processed in parallel
+                    files_by_dir: tp.Dict[str, list[p]] = {}
                     for delfile in chunk:
-                        console.print(move_file_to_trash(
-                            file=delfile, trash=trash, delete=delete))
-                        db.delete_file_lookup(filename=delfile)
-                    db.commit()
-
-                progress.update(task_move_file_to_trash, advance=1)
+                        files_by_dir.setdefault(os.path.dirname(str(delfile)), []).append(delfile)
+                    moved: list[str] = []  # appended to by the workers
+                    futures = [executor.submit(move_files_to_trash, files=files, trash=trash, delete=delete, moved=moved)
+                               for files in files_by_dir.values()]
+                    try:
+                        for future in concurrent.futures.as_completed(futures):
+                            movedfiles = future.result()
+                            for movedfile in movedfiles:
+                                progress.console.print(movedfile)
+                            progress.update(task_move_file_to_trash, advance=len(movedfiles))
+                    finally:
+                        # if a move failed, the other workers may still be running. Wait for them and
+                        # remove all moved files from lookup, before the exception is passed on.
+                        concurrent.futures.wait(futures)
+                        db.delete_files_lookup(moved)
+                        db.commit()
+                    db.execute("BEGIN IMMEDIATE")
+                db.commit()
 
             console.print(displaytext_done +
                           str(len(self._deltable)) + " files\n")
@@ -1,10 +1,12 @@
 import typing as tp
 from collections.abc import Hashable, Iterable
-from itertools import chain
+from itertools import chain, islice
 
 K = tp.TypeVar('K', bound=tp.Hashable)
 V = tp.TypeVar('V', bound=tp.Hashable)
 
+REPR_MAX_ITEMS = 50
+
 
 def check_for_hashable_2tuple(x) -> None:  # type: ignore
     assert isinstance(x, tuple), "no Tuple"
@@ -16,53 +18,59 @@ def check_for_hashable_2tuple(x) -> None:  # type: ignore
     assert isinstance(value, Hashable), "LuTable tuple: value contains non Hashable"
 
 
-def check_argument(x) -> None:  # type: ignore
-    if isinstance(x, tuple):
-        check_for_hashable_2tuple(x)
-    elif isinstance(x, Iterable):
-        for t in x:
-            check_for_hashable_2tuple(t)
-    else:
-        raise AssertionError("no Tuple (k,v) of Hashables or Iterable of such Tuples")
-
-
 class LuTable(tp.Generic[K, V]):
     """
-    class used to represent an Lookup Table for File Hashes. This is basically a Dictionary with hashvalue as key and a list of files as values.
-    A LuTable is therefore an intermediate between a Mapping and a Set. The set is implemented as list and not as set() objects for performance reasons:
-    A set is faster for searching and membership testing, but has a high memory overhead. In contrast lists have low memory overhead but slower membership testing.
-    However, the list of files is typically in the order of 10th, therefore memory impact was rated more severe. To speedup adding of elements,
-    the list is implemented as collections.deque objects. See for further reference:
+    class used to represent an Lookup Table for File Hashes. This is basically a Dictionary with hashvalue as key and a set of files as values.
+    A LuTable is therefore an intermediate between a Mapping and a Set. Files of a hash are stored in set() objects:
+    lists or collections.deque objects have a lower memory overhead, but membership testing is linear. Measurements
+    (see timeit.py) showed no relevant difference in runtime, as the number of files per hash is typically in the order of 10th.
+    See for further reference:
     https://docs.python.org/3/library/collections.abc.html
     https://code.activestate.com/recipes/576694/
 
     A mapping to the hashes is supplied together with set operations for the values. 
     """
 
+    __slots__ = ('_hashlu', '_len', '_ktype', '_vtype')
+
     _hashlu: tp.Dict[K, set[V]]
+    _len: int  # number of (key, value) items, maintained by all methods changing _hashlu
 
-    def __init__(self, x: tp.Union[None, tuple[K, V], list[tuple[K, V]]] = None) -> None:
+    def __init__(self, x: tp.Union[None, tuple[K, V], tp.Iterable[tuple[K, V]]] = None) -> None:
+        """ x is a single (key, value) tuple or any iterable of such tuples, e.g. a generator streaming from the database. """
         self._hashlu = {}
+        self._len = 0
         self._ktype = None
         self._vtype = None
-        if x:
-            check_argument(x)
-            if isinstance(x, list):
-                for t in x:
-                    if not self._ktype:
-                        self._ktype = type(t[0])
-                    if not self._vtype:
-                        self._vtype = type(t[1])
-                    self.add(t)
-            else:
-                self._ktype = type(x[0])
-                self._vtype = type(x[1])
-                self.add(x)
+        if not x:
+            return
+        if isinstance(x, tuple):
+            items: tp.Iterable[tuple[K, V]] = (x,)
+        elif isinstance(x, Iterable):
+            items = x
+        else:
+            raise AssertionError("no Tuple (k,v) of Hashables or Iterable of such Tuples")
+        # group by key in one pass, types are taken from the first item and checked for all others
+        hashlu = self._hashlu
+        for item in items:
+            check_for_hashable_2tuple(item)
+            key, value = item
+            if self._ktype is None:
+                self._ktype = type(key)
+                self._vtype = type(value)
+            assert isinstance(key, self._ktype), "adding inconsistent type"
+            assert isinstance(value, self._vtype), "adding inconsistent type"  # type: ignore
+            bucket = hashlu.get(key)
+            if bucket is None:
+                bucket = hashlu[key] = set()
+            bucket.add(value)
+        self._len = sum(len(bucket) for bucket in hashlu.values())
 
     def __ior__(self, other: 'LuTable[K,V]') -> 'LuTable[K,V]':
         assert isinstance(other, LuTable)
+        add = self.add
         for item in other:
-            self.add(item)
+            add(item)
         return self
 
     def __eq__(self, other: object) -> bool:
@@ -74,20 +82,17 @@ class LuTable(tp.Generic[K, V]):
 
     def __contains__(self, item: tuple[K, V]) -> bool:
         check_for_hashable_2tuple(item)
-        key = item[0]
-        value = item[1]
-        if key in self._hashlu:
-            return (value in self._hashlu[key])
-        else:
-            return False
+        key, value = item
+        bucket = self._hashlu.get(key)
+        return bucket is not None and value in bucket
 
     def __iter__(self) -> tp.Iterator[tuple[K, V]]:
-        for hash in self._hashlu.keys():
-            for file in self._hashlu[hash]:
+        for hash, bucket in self._hashlu.items():
+            for file in bucket:
                 yield hash, file
 
     def __len__(self) -> int:
-        return sum([len(x) for x in self._hashlu.values()])
+        return self._len
 
     def add(self, item: tuple[K, V]) -> None:
         check_for_hashable_2tuple(item)
@@ -99,19 +104,23 @@ class LuTable(tp.Generic[K, V]):
             assert isinstance(value, self._vtype), "adding inconsistent type"
         if key not in self._hashlu:
             self._hashlu[key] = set()
-        self._hashlu[key].add(value)
+        if value not in self._hashlu[key]:
+            self._hashlu[key].add(value)
+            self._len += 1
 
     def discard(self, x: tuple[K, V]) -> None:
         check_for_hashable_2tuple(x)
-        key = x[0]
-        value = x[1]
-        if key not in self._hashlu.keys():
+        key, value = x
+        bucket = self._hashlu.get(key)
+        if bucket is None:
             raise ValueError("invalid tuple: key wrong")
-        if value not in self._hashlu[key]:
+        try:
+            bucket.remove(value)
+        except KeyError:
             raise ValueError("invalid tuple: value wrong")
-        self._hashlu[key].remove(value)
-        if self._hashlu[key] == set():
-            self._hashlu.pop(key)
+        self._len -= 1
+        if not bucket:
+            del self._hashlu[key]
 
     def __str__(self) -> str:
         return(str(self._hashlu))
@@ -119,18 +128,29 @@ class LuTable(tp.Generic[K, V]):
     def __repr__(self) -> str:
         if not self:
             return '%s()' % (self.__class__.__name__,)
+        if self._len > REPR_MAX_ITEMS:
+            # do not materialize large tables, e.g. in log messages or a debugger
+            return '%s(<%d items, first %d: %r>)' % (self.__class__.__name__, self._len, REPR_MAX_ITEMS, list(islice(self, REPR_MAX_ITEMS)))
         return '%s(%r)' % (self.__class__.__name__, list(self))
 
     def lor(self, other: 'LuTable[K,V]') -> None:
-        for k, v in iter(other):
-            if k in self._hashlu.keys():
-                if v not in self._hashlu[k]:
-                    self._hashlu[k].add(v)
+        mine = self._hashlu
+        for k, other_bucket in other._hashlu.items():
+            bucket = mine.get(k)
+            if bucket is None:
+                continue
+            old_len = len(bucket)
+            bucket.update(other_bucket)
+            self._len += len(bucket) - old_len
 
     def ldel(self, iterable: tp.Optional[tp.Iterable[K]] = None) -> None:
+        """ deletes keys given by iterable, keys not in LuTable are ignored """
         if iterable is not None:
+            pop = self._hashlu.pop
             for k in iterable:
-                del self[k]
+                removed = pop(k, None)
+                if removed is not None:
+                    self._len -= len(removed)
 
     def keys(self) -> tp.KeysView[K]:
         return self._hashlu.keys()
@@ -141,32 +161,38 @@ class LuTable(tp.Generic[K, V]):
     def chain_values(self) -> tp.Iterable[V]:
         return chain.from_iterable(self.values())
 
+    def chain_values_str(self) -> tp.Iterator[str]:
+        return map(str, chain.from_iterable(self._hashlu.values()))
+
     def lextend(self, other: 'LuTable[K,V]', key: K) -> None:
         if key not in self._hashlu:
             self._hashlu[key] = set()
-        for v in other[key]:
-            self._hashlu[key].add(v)
+        bucket = self._hashlu[key]
+        old_len = len(bucket)
+        bucket.update(other[key])
+        self._len += len(bucket) - old_len
 
     def __getitem__(self, key: K) -> set[V]:
+        # the bucket must not be changed by the caller, use add/discard/lextend instead
         return self._hashlu[key]
 
     def __setitem__(self, key: K, value: tp.Iterable[V]) -> None:
         assert type(key) == self._ktype, "setting inconsistent key type"
-        for v in value:
+        # copy once, value may be an iterator. A set given by the caller is not aliased,
+        # as changing it afterwards would bypass the item counter.
+        new = set(value)
+        for v in new:
             assert type(v) == self._vtype, "setting inconsistent value type"
-        self._hashlu[key] = set(value)
+        old = self._hashlu.get(key)
+        self._len += len(new) - (len(old) if old is not None else 0)
+        self._hashlu[key] = new
 
     def __delitem__(self, key: K) -> None:
+        self._len -= len(self._hashlu[key])
         del self._hashlu[key]
 
     def as_dict_of_sets(self) -> tp.Dict[str, set[tp.Any]]:
-        dict_of_sets: tp.Dict[str, set[tp.Any]] = {}
-        for hash in self._hashlu.keys():
-            dict_of_sets[str(hash)] = {item for item in self._hashlu[hash]}
-        return dict_of_sets
+        return {str(hash): set(bucket) for hash, bucket in self._hashlu.items()}
 
     def as_dict_of_strsets(self) -> tp.Dict[str, set[str]]:
-        dict_of_sets: tp.Dict[str, set[tp.Any]] = {}
-        for hash in self._hashlu.keys():
-            dict_of_sets[str(hash)] = {str(item) for item in self._hashlu[hash]}
-        return dict_of_sets
+        return {str(hash): set(map(str, bucket)) for hash, bucket in self._hashlu.items()}
@@ -2,10 +2,11 @@ import time
 
 class mytimer:
     def __init__(self) -> None:
-        self.start = time.time()
+        self.start = time.perf_counter_ns()
 
     @property 
     def get(self) -> str:
-        delta: float = round(time.time()- self.start, 2)
-        self.start = time.time()
-        return str(delta)
+        now = time.perf_counter_ns()
+        delta: float = (now - self.start) / 1e9
+        self.start = now
+        return f"{delta:.2f}"
@@ -1,3 +1,4 @@
+import ntpath
 import os
 from pathlib import Path as p
 import tempfile
@@ -7,6 +8,7 @@ import pydupe.dupetable as dupetable
 import pytest
 from pydupe.db import PydupeDB
 from pydupe.data import fparms
+from pydupe.lutable import LuTable
 
 cwd = str(p.cwd())
 tdata = cwd + "/pydupe/pydupe/tests/tdata/"
@@ -80,6 +82,29 @@ class TestDupetable:
             'be1c1a22b4055523a0d736f4174ef1d6be1c1a22b4055523a0d736f4174ef1d6': {'/tests/tdata/file_exists'}
         }
 
+    def test_Dupetable_tables_from_stream(self) -> None:
+        dbname = p.cwd() / '.dbtest.sqlite'
+        deldir = p("/tests/tdata/somedir")
+        d, k = dupetable.dd3(dupetable.iter_dupes(dbname), deldir=deldir, pattern="_dupe", match_deletions=True, dupes_global=True)
+        d_should, k_should = dupetable.dd3(dupetable.get_dupes(dbname), deldir=deldir, pattern="_dupe", match_deletions=True, dupes_global=True)
+        assert (d, k) == (d_should, k_should)
+
+    def test_get_dupes_partitioned(self) -> None:
+        dbname = p.cwd() / '.dbtest.sqlite'
+        hashlu = dupetable.get_dupes(dbname=dbname)
+        for deldir in [p("/tests/tdata/somedir"), p("/tests/tdata"), p("/tests/tdata/some"), p("/")]:
+            in_deldir, outside_deldir = dupetable.get_dupes_partitioned(deldir, dbname)
+            assert (in_deldir, outside_deldir) == dupetable.partition(hashlu, deldir=deldir)
+
+    def test_partition_windows_paths(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        # windows path semantics: backslash separator, case insensitive
+        monkeypatch.setattr(os, 'path', ntpath)
+        dupes = [('h1', p('C:\\Data\\DelDir\\a')), ('h1', p('C:\\data\\deldir2\\a')),
+                 ('h2', p('C:\\data\\deldir\\sub\\b')), ('h2', p('C:\\data\\other\\b')), ('h3', p('C:\\data\\other\\c'))]
+        in_deldir, outside_deldir = dupetable.partition(dupes, deldir=p('c:\\data\\deldir'))
+        assert in_deldir == LuTable([('h1', p('C:\\Data\\DelDir\\a')), ('h2', p('C:\\data\\deldir\\sub\\b'))])
+        assert outside_deldir == LuTable([('h1', p('C:\\data\\deldir2\\a')), ('h2', p('C:\\data\\other\\b'))])
+
     def test_dir_counter(self) -> None:
         Dp = dupetable.Dupes(dbname=p.cwd() / '.dbtest.sqlite')
         dir_counter = Dp.get_dir_counter()
@@ -87,6 +112,34 @@ class TestDupetable:
             '/tests/tdata': 1,
             '/tests/tdata/somedir': 3
         }
+        Dp.dupes
+        assert Dp.get_dir_counter() == dir_counter
+
+    def test_check_file(self) -> None:
+        somefile = p.cwd() / 'somefile'
+        somefile.write_text('some text')
+        somelink = p.cwd() / 'somelink'
+        somelink.symlink_to(somefile)
+        somedir = p.cwd() / 'somedir'
+        somedir.mkdir()
+
+        dupetable.check_file(str(somefile))
+        with pytest.raises(dupetable.DupeFileNotFound):
+            dupetable.check_file(str(p.cwd() / 'nothere'))
+        with pytest.raises(dupetable.DupeFileNotFound):
+            dupetable.check_file(str(somefile / 'child'))
+        with pytest.raises(dupetable.DupeIsSymLink):
+            dupetable.check_file(str(somelink))
+        with pytest.raises(dupetable.DupeIsDirectory):
+            dupetable.check_file(str(somedir))
+
+    def test_rename_if_exists(self) -> None:
+        somefile = p.cwd() / 'somefile.txt'
+        assert dupetable.rename_if_exists(str(somefile)) == str(somefile)
+        somefile.write_text('some text')
+        (p.cwd() / 'somefile_1.txt').write_text('some text')
+        assert dupetable.rename_if_exists(str(somefile)) == str(p.cwd() / 'somefile_2.txt')
+
 
     def test_raise_if_all_files_marked_for_deletion(self) -> None:
         Dp = dupetable.Dupetable(dbname=p.cwd() / '.dbtest.sqlite', deldir=p("/"), pattern=".", autoselect=True, dedupe=True)
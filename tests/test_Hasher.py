@@ -52,11 +52,12 @@ class TestHasher:
         pydupe.hasher.scan_files_on_disk_and_insert_stats_in_db(dbname, path)
         data_should: tp.List[tp.Optional[fparms]] = []
         for item in path.rglob("*"):
-            data_should.append(from_path(item))
+            if item.is_file():
+                data_should.append(from_path(item))
 
         data_get = [from_row(d) for d in PydupeDB(dbname).get().fetchall()]
 
-        assert data_get.sort() == data_should.sort()
+        assert sorted(data_get) == sorted(data_should)
 
     def test_move_dbcontent_for_dir_to_permanent(self, setup_tmp_path: str) -> None:
         tmpdirname = setup_tmp_path
@@ -66,6 +67,8 @@ class TestHasher:
         path_1 = p(tmpdirname + "/somedir/somefile.txt")
         pydupe.hasher.clean(dbname)
         pydupe.hasher.scan_files_on_disk_and_insert_stats_in_db(dbname, path)
+        # only hashed rows are copied to permanent, the files in somedir2 are of equal size
+        pydupe.hasher.rehash_dupes_where_hash_is_NULL(dbname)
         with PydupeDB(dbname) as db:
             db.copy_dir_to_table_permanent(path_2)
             db.delete_dir(path_2)
@@ -73,7 +76,7 @@ class TestHasher:
 
         data_should_permanent: tp.List[tp.Optional[fparms]] = []
         for item in path_2.rglob("*"):
-            data_should_permanent.append(from_path(item))
+            data_should_permanent.append(from_path(item, hash=pydupe.hasher.hash_file(str(item))))
 
         data_should_lookup: tp.List[tp.Optional[fparms]] = []
         data_should_lookup.append(from_path(path_1)) 
@@ -86,8 +89,8 @@ class TestHasher:
         data_get_lookup = [from_row(d) for d in PydupeDB(
             dbname).execute(sql_execute_lookup).fetchall()]
 
-        assert data_get_lookup.sort() == data_should_lookup.sort()
-        assert data_get_permanent.sort() == data_should_permanent.sort()
+        assert sorted(data_get_lookup) == sorted(data_should_lookup)
+        assert sorted(data_get_permanent) == sorted(data_should_permanent)
 
     def test_copy_dbcontent_for_dir_to_permanent(self, setup_tmp_path: str) -> None:
         tmpdirname = setup_tmp_path
@@ -97,15 +100,17 @@ class TestHasher:
         path_1 = p(tmpdirname + "/somedir/somefile.txt")
         pydupe.hasher.clean(dbname)
         pydupe.hasher.scan_files_on_disk_and_insert_stats_in_db(dbname, path)
+        pydupe.hasher.rehash_dupes_where_hash_is_NULL(dbname)
         with PydupeDB(dbname) as db:
             db.copy_dir_to_table_permanent(path)
             db.commit()
 
         data_should_permanent: tp.List[tp.Optional[fparms]] = []
         for item in path_2.rglob("*"):
-            data_should_permanent.append(from_path(item))
+            data_should_permanent.append(from_path(item, hash=pydupe.hasher.hash_file(str(item))))
 
-        data_should_lookup: tp.List[tp.Optional[fparms]] = []
+        # lookup is left unchanged by the copy
+        data_should_lookup: tp.List[tp.Optional[fparms]] = list(data_should_permanent)
         data_should_lookup.append(from_path(path_1)) 
 
         sql_execute_permanent = "SELECT * FROM permanent"
@@ -116,8 +121,8 @@ class TestHasher:
         data_get_lookup = [from_row(d) for d in PydupeDB(
             dbname).execute(sql_execute_lookup).fetchall()]
 
-        assert data_get_lookup.sort() == data_should_lookup.sort()
-        assert data_get_permanent.sort() == data_should_permanent.sort()
+        assert sorted(data_get_lookup) == sorted(data_should_lookup)
+        assert sorted(data_get_permanent) == sorted(data_should_permanent)
 
 
     def notest_rehash_rows_where_hash_is_NULL(self, setup_tmp_path: str) -> None:
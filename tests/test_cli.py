@@ -9,6 +9,7 @@ from pydupe.cli import cli
 import typing as tp
 
 from pydupe.db import PydupeDB
+from pydupe import dupetable
 
 
 runner = CliRunner()
@@ -81,6 +82,28 @@ class TestCLI:
         assert result == {'file1', 'file2',
                           'file3', 'file4', 'file5', 'file6', }
 
+    def test_dd_failed_move_keeps_lookup_consistent(self, setup_tmp_path: p, monkeypatch: pytest.MonkeyPatch) -> None:
+        tmpdirname = setup_tmp_path
+        dbname = str(tmpdirname) + '/.testdb.sqlite'
+        trash = tmpdirname / '.pydupeTrash'
+        move_file_to_trash = dupetable.move_file_to_trash
+
+        def failing_move_file_to_trash(*, file: p, **kwargs: tp.Any) -> str:
+            if file.name == 'file4':
+                raise OSError("move failed")
+            return move_file_to_trash(file=file, **kwargs)
+
+        monkeypatch.setattr(dupetable, 'move_file_to_trash', failing_move_file_to_trash)
+        result = runner.invoke(cli, ['--dbname', dbname, 'dd', '-tr', str(trash), '--do_move', str(tmpdirname) + '/somedir/somedir2'])
+        assert isinstance(result.exception, OSError)
+
+        # files moved before the failure are removed from lookup, the others are kept
+        with PydupeDB(p(dbname)) as db:
+            in_lookup = set(db.get_list_of_files_in_dir(str(tmpdirname) + '/somedir/somedir2'))
+        on_disk = {str(f) for f in (tmpdirname / 'somedir' / 'somedir2').iterdir()}
+        assert in_lookup == on_disk
+        assert str(tmpdirname) + '/somedir/somedir2/file4' in on_disk
+
     def test_do_move_with_rename_file_1(self, setup_tmp_path: p) -> None:
         tmpdirname = setup_tmp_path
         trash = tmpdirname / '.pydupeTrash'
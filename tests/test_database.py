@@ -2,7 +2,7 @@ import os
 import tempfile
 import pytest
 from pydupe.data import fparms
-from pydupe.db import PydupeDB
+from pydupe.db import PydupeDB, dir_range
 from pathlib import Path as p
 import typing as tp
 
@@ -271,6 +271,53 @@ class TestDatabase:
              'hash': '3aa2ed13ee40ba651e87a0fd60b753d03aa2ed13ee40ba651e87a0fd60b753d0'}
         ]
 
+    def test_get_dupes_partitioned(self) -> None:
+
+        dbname = p.cwd() / ".dbtest.sqlite"
+        with PydupeDB(dbname) as db:
+            in_deldir, outside_deldir = db.get_dupes_partitioned(p('/tests/tdata/somedir'))
+
+        assert sorted(row['filename'] for row in in_deldir) == [
+            '/tests/tdata/somedir/dupe2_in_dir',
+            '/tests/tdata/somedir/dupe_in_dir',
+            '/tests/tdata/somedir/file_is_dupe']
+        assert [row['filename'] for row in outside_deldir] == ['/tests/tdata/file_exists']
+
+    def test_get_dupes_partitioned_large(self) -> None:
+
+        dbname = p.cwd() / ".dbtest_large.sqlite"
+        n = 20000
+        with PydupeDB(dbname) as db:
+            # file i and file i + n share a hash, half of the dupes are in deldir
+            db.parms_insert([fparms(filename=f'/data/{"deldir" if i < n // 2 else "other"}/file{i}', hash=f'{i % n:064x}',
+                                    size=1, inode=i, mtime=1, ctime=1) for i in range(2 * n)])
+            db.commit()
+            # the join on hash must use the index, a full scan per dupe hash is quadratic
+            plan = db.execute("EXPLAIN QUERY PLAN SELECT l.filename FROM lookup l JOIN lookup h on l.hash = h.hash").fetchall()
+            assert any('idx_lookup_hash' in row['detail'] for row in plan)
+            in_deldir, outside_deldir = db.get_dupes_partitioned(p('/data/deldir'))
+
+        assert len(in_deldir) == n // 2
+        assert len(outside_deldir) == n // 2
+        assert {row['hash'] for row in in_deldir} == {row['hash'] for row in outside_deldir}
+
+    @pytest.mark.parametrize('sep, deldir, inside, outside', [
+        ('/', '/data/deldir', ['/data/deldir/a', '/data/deldir/sub/b'], ['/data/deldir2/a', '/data/deldir', '/data/deldir.txt', '/data/a']),
+        ('/', '/', ['/a', '/data/b'], []),
+        ('\\', 'C:\\data\\deldir', ['C:\\data\\deldir\\a', 'C:\\data\\deldir\\sub\\b'],
+         ['C:\\data\\deldir2\\a', 'C:\\data\\deldir', 'C:\\data\\deldir.txt', 'C:\\data\\a', 'C:\\data\\deldir/a']),
+        ('\\', 'C:\\', ['C:\\a', 'C:\\data\\b'], ['D:\\a']),
+        ])
+    def test_dir_range(self, sep: str, deldir: str, inside: tp.List[str], outside: tp.List[str]) -> None:
+        lower, upper = dir_range(deldir, sep)
+        dbname = p.cwd() / ".dbtest.sqlite"
+        with PydupeDB(dbname) as db:
+            db.clean_lookup()
+            db.parms_insert([fparms(filename=f) for f in inside + outside])
+            data_get = db.cur.execute("SELECT filename FROM lookup WHERE filename >= ? AND filename < ?", (lower, upper)).fetchall()
+
+        assert sorted(row['filename'] for row in data_get) == sorted(inside)
+
     def test_delete_dir(self) -> None:
         
         dbname = p.cwd() / ".dbtest.sqlite"
@@ -305,6 +352,22 @@ class TestDatabase:
              'hash': '3aa2ed13ee40ba651e87a0fd60b753d03aa2ed13ee40ba651e87a0fd60b753d0'}
         ]
 
+    def test_delete_files(self) -> None:
+        
+        dbname = p.cwd() / ".dbtest.sqlite"
+        with PydupeDB(dbname) as db:
+            db.delete_files_lookup([p('/tests/tdata/file_exists'), p('/tests/tdata/somedir/dupe_in_dir')])
+            data_get = db.get_file_hash().fetchall()
+        
+        data_dict = [dict(row) for row in data_get]
+
+        assert data_dict == [
+            {'filename': '/tests/tdata/somedir/file_is_dupe',
+             'hash': 'be1c1a22b4055523a0d736f4174ef1d6be1c1a22b4055523a0d736f4174ef1d6'},
+            {'filename': '/tests/tdata/somedir/dupe2_in_dir',
+             'hash': '3aa2ed13ee40ba651e87a0fd60b753d03aa2ed13ee40ba651e87a0fd60b753d0'}
+        ]
+
     def test_copy_dir_to_table_permanent(self) -> None:
         """check data inserted in fixture 'setup_database' works."""
         
@@ -12,6 +12,7 @@ class TestLuTable:
     six = pl.Path("/tmp/six")
     seven = pl.Path("/tmp/seven")
     eight = pl.Path("/tmp/eight")
+    nine = pl.Path("/tmp/nine")
 
     @pytest.mark.parametrize('tpl',
     [1,      # wrong or no tuple
@@ -34,10 +35,17 @@ class TestLuTable:
         assert isinstance(a,LuTable)
         # assert repr(a) == "LuTable([('key', value)])"
         # assert str(a) == "{'key': {value}}"
+        b = LuTable((k, v) for k, v in [('1',self.two),('3',self.four),('3',self.five),('3',self.four)])
+        assert b == LuTable([('1',self.two),('3',self.four),('3',self.five)])
+        assert len(b) == 3
+        with pytest.raises(AssertionError):
+            LuTable(x for x in [(5,6), (7,'8')])
     
     def test_contains(self) -> None:
         a = LuTable([("1",self.two),("3",self.four)])
         assert ("1",self.two) in a
+        assert ("1",self.four) not in a
+        assert ("2",self.two) not in a
     
     def test_iter(self) -> None:
         a = LuTable([("1",self.two),("3",self.four)])
@@ -47,6 +55,19 @@ class TestLuTable:
     def test_len(self) -> None:
         a = LuTable([('1',self.two),('3',self.four),('3',self.five),('3',self.six)])
         assert len(a) == 4
+        a.add(('1',self.two))
+        assert len(a) == 4
+        a.discard(('3',self.four))
+        assert len(a) == 3
+        a.lor(LuTable([('1',self.three),('1',self.two),('9',self.nine)]))
+        assert len(a) == 4
+        a.lextend(LuTable([('7',self.seven),('7',self.eight)]), '7')
+        assert len(a) == 6
+        a['7'] = [self.eight]
+        assert len(a) == 5
+        a.ldel(['3', '7'])
+        assert len(a) == 2
+        assert len(a) == sum(len(x) for x in a.values())
     
     def test_add(self) -> None:
         a = LuTable[str,pl.Path]()
@@ -99,6 +120,8 @@ class TestLuTable:
         assert a == LuTable([('1',self.two), ('5',self.eight)])
         a.ldel('1')
         assert a == LuTable(('5',self.eight))
+        a.ldel(['nothere'])
+        assert a == LuTable(('5',self.eight))
         with pytest.raises(TypeError):
             a.ldel[['5', 'nothere']] #type: ignore
         with pytest.raises(TypeError):
@@ -116,12 +139,20 @@ class TestLuTable:
         a = LuTable([('1',self.two),('3',self.four),('3',self.five),('3',self.six)])
         assert set(a.chain_values()) == {self.two,self.four,self.five,self.six}
 
+    def test_chain_values_str(self) -> None:
+        a = LuTable([('1',self.two),('3',self.four),('3',self.five),('3',self.six)])
+        assert set(a.chain_values_str()) == {'/tmp/two','/tmp/four','/tmp/five','/tmp/six'}
+
     def test_lexted(self) -> None:
         a = LuTable([(1,2),(3,4)])
         b = LuTable([(1,7), (3,5),(4,6)])
         a.lextend(b,3)
         assert repr(a) == "LuTable([(1, 2), (3, 4), (3, 5)])"
 
+    def test_repr_large(self) -> None:
+        a = LuTable([(1, i) for i in range(100)])
+        assert repr(a) == "LuTable(<100 items, first 50: %r>)" % ([(1, i) for i in range(50)],)
+
     def test_getitem(self) -> None:
         a = LuTable([(1,2),(3,4),(3,5),(3,6)])
         assert a[1] == {2}
@@ -130,6 +161,8 @@ class TestLuTable:
         a = LuTable([(1,2),(3,4),(3,5),(3,6)])
         a[7] = [8]
         assert a[7] == {8}
+        a[7] = (x for x in [8, 9])
+        assert a[7] == {8, 9}
         with pytest.raises(AssertionError):
             a[7] = [8,'9'] # type: ignore  
 